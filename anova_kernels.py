@@ -0,0 +1,73 @@
+# anova_kernels.py
+"""Kernels numéricos do dashboard de ANOVA.
+
+Ficam num módulo importável (e não no script do Streamlit, que é reexecutado a cada interação)
+para que o dispatcher compilado pelo Numba permaneça em sys.modules entre os reruns.
+"""
+import numpy as np
+from scipy.stats import chi2, rankdata
+
+try:
+    from numba import njit
+except ImportError:  # numba não instalado: usa a versão NumPy do kernel de ANOVA
+    njit = None
+
+
+def _anova_ss_loop(y, codes, k):
+    """Decomposição SSB/SSW de um fator: uma única passada sobre y, mais um laço sobre os k grupos.
+
+    Acumula sobre y deslocado por y[0] (shifted data) para evitar cancelamento numérico
+    com preços da ordem de 1e5, sem precisar de uma passada extra para a média geral.
+    """
+    n_total = y.shape[0]
+    deslocamento = y[0]
+    n = np.zeros(k, dtype=np.int64)
+    soma = np.zeros(k, dtype=np.float64)
+    soma_q_total = 0.0
+    for i in range(n_total):
+        desvio = y[i] - deslocamento
+        n[codes[i]] += 1
+        soma[codes[i]] += desvio
+        soma_q_total += desvio * desvio
+
+    means = np.empty(k, dtype=np.float64)
+    soma_total = 0.0
+    soma_q_entre = 0.0  # Σ soma_j² / n_j
+    for j in range(k):
+        media_deslocada = soma[j] / n[j]
+        means[j] = media_deslocada + deslocamento
+        soma_total += soma[j]
+        soma_q_entre += soma[j] * media_deslocada
+    ssb = soma_q_entre - soma_total * soma_total / n_total
+    return n, means, ssb, soma_q_total - soma_q_entre
+
+
+def _anova_ss_numpy(y, codes, k):
+    """Mesma decomposição de `_anova_ss_loop`, vetorizada com np.bincount."""
+    deslocamento = y[0]
+    desvios = y - deslocamento
+    n = np.bincount(codes, minlength=k)
+    soma = np.bincount(codes, weights=desvios, minlength=k)
+    media_deslocada = soma / n
+    soma_q_entre = (soma * media_deslocada).sum()
+    ssb = soma_q_entre - soma.sum() ** 2 / len(y)
+    return n, media_deslocada + deslocamento, ssb, (desvios * desvios).sum() - soma_q_entre
+
+
+anova_ss = njit(cache=True)(_anova_ss_loop) if njit is not None else _anova_ss_numpy
+
+
+def kruskal_ordenado(y_ordenado, limites):
+    """Kruskal-Wallis sobre um buffer já ordenado por grupo (um único rankdata, com correção de empates)."""
+    n_total = len(y_ordenado)
+    n = np.diff(limites)
+    ranks = rankdata(y_ordenado, method='average')
+    soma_ranks = np.add.reduceat(ranks, limites[:-1])
+    h = 12.0 / (n_total * (n_total + 1)) * (soma_ranks ** 2 / n).sum() - 3.0 * (n_total + 1)
+
+    _, empates = np.unique(y_ordenado, return_counts=True)
+    correcao = 1.0 - (empates.astype(np.float64) ** 3 - empates).sum() / (float(n_total) ** 3 - n_total)
+    if correcao == 0:  # Todos os valores iguais: estatística indefinida (mesmo comportamento do scipy)
+        return np.nan, np.nan
+    h /= correcao
+    return h, chi2.sf(h, len(n) - 1)
@@ -1,27 +1,125 @@
 # streamlit_dashboard_anova.py
+import hashlib
+import io
+import logging
+import os
+import string
+import tempfile
+import threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import pandas as pd
 import statsmodels.api as sm
-from statsmodels.formula.api import ols
-from scipy.stats import shapiro, levene, kruskal, anderson
+from scipy.stats import shapiro, levene, anderson, gaussian_kde, f as f_dist
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np  # Adicionado para lidar com potenciais issues numéricas
 
+from anova_kernels import anova_ss, kruskal_ordenado
+
+logger = logging.getLogger(__name__)
+
 
 # --- Funções de Análise (Adaptadas do script anterior) ---
 
-@st.cache_data  # Cache para otimizar o carregamento de dados
+TAMANHO_AMOSTRA_SHAPIRO = 1000  # Acima disso, Shapiro-Wilk roda sobre uma subamostra aleatória fixa
+P_VALOR_DISPENSA_KRUSKAL = 1e-8  # Com ANOVA tão significativa e grupos grandes, Kruskal-Wallis é dispensado
+MIN_OBS_DISPENSA_KRUSKAL = 30
+TAMANHO_AMOSTRA_QQ = 500  # Pontos exibidos no Q-Q plot
+MAX_OBS_BOXPLOT_OUTLIERS = 2000  # Acima disso o boxplot não desenha os outliers individuais
+CARACTERES_VALIDOS_COLUNA = frozenset(string.ascii_letters + string.digits + '_')
+MODO_DEBUG = os.environ.get("AMES_DEBUG") == "1"  # Ativa verificações extras (ex.: ausência de NaNs)
+VERSAO_LIMPEZA = 1  # Incrementar ao mudar a limpeza de load_data: invalida os parquets salvos
+
+
+@st.cache_data(show_spinner=False)  # Evita baixar o CSV novamente a cada cache miss de load_data
+def _download_csv(url):
+    """Baixa o conteúdo bruto do CSV de uma URL."""
+    with urllib.request.urlopen(url) as resposta:
+        return resposta.read()
+
+
+def _parse_csv(conteudo):
+    """Lê o CSV com o engine pyarrow (colunas Arrow), com fallback para o engine padrão."""
+    try:
+        return pd.read_csv(io.BytesIO(conteudo), engine='pyarrow', dtype_backend='pyarrow')
+    except ImportError:  # pyarrow não instalado
+        return pd.read_csv(io.BytesIO(conteudo))
+
+
+def _limpar_nomes_colunas(colunas):
+    """Remove caracteres fora de [A-Za-z0-9_] e converte para minúsculas (sem regex)."""
+    # A tabela cobre os caracteres efetivamente presentes, inclusive não-ASCII
+    tabela = str.maketrans({ch: None for ch in set(''.join(colunas)) if ch not in CARACTERES_VALIDOS_COLUNA})
+    return [col.translate(tabela).lower() for col in colunas]
+
+
+def _caminho_parquet_limpo(url):
+    """Caminho do parquet com o dataset limpo, específico da URL de origem e da versão da limpeza."""
+    chave = hashlib.sha1(f"{url}|v{VERSAO_LIMPEZA}".encode()).hexdigest()[:16]
+    return os.path.join(tempfile.gettempdir(), f"ames_clean_v{VERSAO_LIMPEZA}_{chave}.parquet")
+
+
+def _parquet_limpo_valido(df):
+    """Confere se o frame tem o formato produzido pela limpeza atual de load_data."""
+    if 'saleprice' not in df.columns or df['saleprice'].dtype != np.float32:
+        return False
+    categoricas = {col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype)}
+    nao_numericas = {col for col in df.columns if not pd.api.types.is_numeric_dtype(df[col])}
+    return bool(categoricas) and nao_numericas <= categoricas  # Toda coluna de texto já vira categoria
+
+
+def _carregar_parquet_limpo(url):
+    """Lê (com memory map) o dataset limpo salvo para `url`; retorna None se ausente ou inválido."""
+    caminho = _caminho_parquet_limpo(url)
+    if not os.path.exists(caminho):
+        return None
+    try:
+        df = pd.read_parquet(caminho, engine='pyarrow', memory_map=True)
+    except (ImportError, OSError, ValueError) as e:  # pyarrow ausente ou arquivo corrompido
+        logger.warning("Ignorando parquet limpo ilegível em %s: %s", caminho, e)
+        return None
+    if not _parquet_limpo_valido(df):
+        logger.warning("Ignorando parquet limpo com formato inesperado em %s", caminho)
+        return None
+    return df
+
+
+def _salvar_parquet_limpo(df, url):
+    """Grava o dataset limpo de forma atômica (arquivo temporário + os.replace)."""
+    caminho = _caminho_parquet_limpo(url)
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(temporario, engine='pyarrow')
+        os.replace(temporario, caminho)
+    except (ImportError, OSError, ValueError, TypeError) as e:  # pyarrow ausente, disco, tipos não suportados
+        logger.warning("Não foi possível salvar o parquet limpo em %s: %s", caminho, e)
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+
+@st.cache_resource(show_spinner=False)  # Instância única por processo, compartilhada entre sessões
 def load_data():
-    """Carrega o Ames Housing Dataset de uma URL e faz uma limpeza básica."""
+    """Carrega o Ames Housing Dataset (parquet local ou URL) e faz uma limpeza básica."""
     urls_tentativas = [
         "https://raw.githubusercontent.com/Viniciusalgueiro/Ameshousing/refs/heads/main/AmesHousing.csv"
     ]
+    for url in urls_tentativas:
+        df = _carregar_parquet_limpo(url)
+        if df is not None:
+            # O parquet guarda o resultado da limpeza: preço já renomeado e categorias já convertidas
+            st.success(f"Dataset carregado com sucesso de: {url}")
+            colunas_categoricas_potenciais = sorted(
+                col for col in df.columns if isinstance(df[col].dtype, pd.CategoricalDtype))
+            return df, 'saleprice', colunas_categoricas_potenciais, df.columns.tolist()
+
     df = None
     url_carregada = ""
     for url in urls_tentativas:
         try:
-            df = pd.read_csv(url)
+            df = _parse_csv(_download_csv(url))
             url_carregada = url
             break
         except Exception:
@@ -32,7 +130,7 @@ def load_data():
         return None, None, [], []
 
     st.success(f"Dataset carregado com sucesso de: {url_carregada}")
-    df.columns = df.columns.str.replace('[^A-Za-z0-9_]+', '', regex=True).str.lower()
+    df.columns = _limpar_nomes_colunas(df.columns)
 
     coluna_preco_nome = None
     if 'saleprice' in df.columns:
@@ -44,56 +142,83 @@ def load_data():
 
     if coluna_preco_nome:
         df[coluna_preco_nome] = pd.to_numeric(df[coluna_preco_nome], errors='coerce')
-        df.dropna(subset=[coluna_preco_nome], inplace=True)
-
-    colunas_categoricas_potenciais = df.select_dtypes(include=['object']).columns.tolist()
-    colunas_numericas_discretas = [col for col in df.select_dtypes(include=np.number).columns
-                                   if df[col].nunique() < 20 and col != coluna_preco_nome]  # Exemplo de heurística
+        # Filtra NaNs e reduz para float32 (preços < ~$1M) numa só expressão, sem dropna(inplace=True)
+        df = df[df[coluna_preco_nome].notna()].astype({coluna_preco_nome: 'float32'})
+
+    # is_numeric_dtype reconhece tanto dtypes NumPy quanto Arrow (strings Arrow não são 'object')
+    colunas_numericas = [col for col in df.columns if pd.api.types.is_numeric_dtype(df[col])]
+    colunas_categoricas_potenciais = [col for col in df.columns if col not in colunas_numericas]
+    nunq = df[colunas_numericas].nunique()  # Uma única varredura para todas as colunas numéricas
+    colunas_numericas_discretas = nunq.index[(nunq < 20) & (nunq.index != coluna_preco_nome)].tolist()  # Heurística
     colunas_categoricas_potenciais.extend(colunas_numericas_discretas)
 
     # Remover duplicatas e garantir que a coluna de preço não está na lista
     colunas_categoricas_potenciais = sorted(
         list(set(col for col in colunas_categoricas_potenciais if col != coluna_preco_nome)))
 
-    return df, coluna_preco_nome, colunas_categoricas_potenciais, df.columns.tolist()
+    # Converte uma única vez para Categorical (códigos inteiros + dicionário de níveis)
+    for col in colunas_categoricas_potenciais:
+        df[col] = df[col].astype('category')
 
+    if coluna_preco_nome:  # Sem coluna de preço o parquet seria rejeitado na leitura
+        _salvar_parquet_limpo(df, url_carregada)
+
+    return df, coluna_preco_nome, colunas_categoricas_potenciais, df.columns.tolist()
 
-def perform_anova_for_variable(df_analysis, var_cat, col_preco):
-    """Executa ANOVA e testes de pressupostos para uma variável."""
-    results = {"var_cat": var_cat, "plots": {}}
 
-    df_var = df_analysis[[var_cat, col_preco]].copy()
+@st.cache_data(show_spinner=False, max_entries=64)  # Cache dos cálculos (os PNGs têm cache próprio)
+def _anova_compute(df_analysis, var_cat, col_preco):
+    """Calcula ANOVA e testes de pressupostos; retorna apenas dados serializáveis.
 
-    # Converter para categoria se não for e garantir que tem pelo menos 2 níveis
-    if df_var[var_cat].dtype != 'object' and not pd.api.types.is_categorical_dtype(df_var[var_cat]):
-        df_var[var_cat] = df_var[var_cat].astype('category')
+    df_analysis deve conter apenas [var_cat, col_preco], sem NaNs (o loop principal já os remove).
+    """
+    _registrar_cache("misses")  # O corpo só executa quando o resultado não está em cache
+    results = {"var_cat": var_cat}
 
-    df_var.dropna(inplace=True)  # Remove NaNs especificamente para este par
+    df_var = df_analysis
+    if MODO_DEBUG and df_var.isna().any().any():
+        raise ValueError(f"df_analysis chegou com NaNs em [{var_cat}, {col_preco}]")
 
     if df_var[var_cat].nunique() < 2 or len(df_var) < 10:  # Mínimo de observações e níveis
         results["error"] = "Dados insuficientes ou poucos níveis para análise após limpeza."
+        results["dados_insuficientes"] = True
         return results
 
-    formula = f'{col_preco} ~ C({var_cat})'
     try:
-        modelo = ols(formula, data=df_var).fit()
-        results["anova_table"] = sm.stats.anova_lm(modelo, typ=2)
-
-        p_valor_anova = None
-        if f'C({var_cat})' in results["anova_table"].index:
-            p_valor_anova = results["anova_table"].loc[f'C({var_cat})', 'PR(>F)']
-        elif not results["anova_table"].empty:
-            p_valor_anova = results["anova_table"]['PR(>F)'].iloc[0]
+        # ANOVA de um fator em forma fechada (evita a matriz de dummies do OLS)
+        gb = df_var.groupby(var_cat, observed=True)[col_preco]
+        y32 = df_var[col_preco].to_numpy(dtype=np.float32)  # Sem cópia: a coluna já é float32 (load_data)
+        y = y32.astype(np.float64)  # Upcast apenas para as somas de quadrados
+        codes = gb.ngroup().to_numpy(dtype=np.int64)
+        k, n_total = gb.ngroups, len(y)
+        n, means, ssb, ssw = anova_ss(y, codes, k)
+        df_entre, df_dentro = k - 1, n_total - k
+        f_stat = (ssb / df_entre) / (ssw / df_dentro)
+        p_valor_anova = f_dist.sf(f_stat, df_entre, df_dentro)
+
+        results["anova_table"] = pd.DataFrame(
+            {"sum_sq": [ssb, ssw], "df": [float(df_entre), float(df_dentro)],
+             "F": [f_stat, np.nan], "PR(>F)": [p_valor_anova, np.nan]},
+            index=[f'C({var_cat})', 'Residual'])
         results["p_valor_anova"] = p_valor_anova
 
-        residuos = modelo.resid
+        # Buffer float64 contíguo: shapiro/anderson convertem internamente para float64, então
+        # entregar já nesse formato evita uma cópia; o cache/gráficos guardam a versão float32
+        residuos = np.ascontiguousarray(y - np.take(means, codes), dtype=np.float64)
+        results["residuos"] = residuos.astype(np.float32)
         results["residuos_count"] = len(residuos)
 
         # 1. Normalidade dos resíduos
         normalidade_ok = False
         if len(residuos) >= 3:
             if len(residuos) <= 5000:
-                stat_shapiro, p_shapiro = shapiro(residuos)
+                amostra_shapiro = residuos
+                if len(residuos) > TAMANHO_AMOSTRA_SHAPIRO:
+                    # Subamostra fixa: mesma decisão a 5% com uma fração do custo
+                    rng = np.random.default_rng(0)
+                    amostra_shapiro = rng.choice(residuos, TAMANHO_AMOSTRA_SHAPIRO, replace=False)
+                results["shapiro_amostra"] = len(amostra_shapiro)
+                stat_shapiro, p_shapiro = shapiro(amostra_shapiro)
                 results["shapiro_test"] = (stat_shapiro, p_shapiro)
                 if p_shapiro >= 0.05: normalidade_ok = True
             else:
@@ -105,24 +230,14 @@ def perform_anova_for_variable(df_analysis, var_cat, col_preco):
                     normalidade_ok = True
         results["normalidade_ok"] = normalidade_ok
 
-        # Plots de Normalidade
-        fig_norm, ax_norm = plt.subplots(1, 2, figsize=(10, 4))
-        if len(residuos) > 1:
-            sns.histplot(residuos, kde=True, ax=ax_norm[0], stat="density", bins=30)
-            ax_norm[0].set_title(f'Histograma Resíduos ({var_cat})', fontsize=10)
-            sm.qqplot(residuos, line='s', ax=ax_norm[1], markerfacecolor="skyblue", markeredgecolor="dodgerblue",
-                      alpha=0.7)
-            ax_norm[1].set_title(f'Q-Q Plot Resíduos ({var_cat})', fontsize=10)
-        else:
-            ax_norm[0].text(0.5, 0.5, "Poucos dados", ha='center', va='center')
-            ax_norm[1].text(0.5, 0.5, "Poucos dados", ha='center', va='center')
-        plt.tight_layout()
-        results["plots"]["normalidade"] = fig_norm
-
         # 2. Homocedasticidade (Teste de Levene)
         homocedasticidade_ok = False
-        grupos = [df_var[col_preco][df_var[var_cat] == categoria].dropna() for categoria in df_var[var_cat].unique()]
-        grupos_validos = [g for g in grupos if len(g) >= 2]  # Levene precisa de grupos com pelo menos 2 obs
+        # Ordena uma vez por código de grupo: cada grupo vira uma fatia contígua do mesmo buffer
+        ordem = np.argsort(codes, kind='stable')
+        y_ordenado = y32[ordem]
+        limites = np.searchsorted(codes[ordem], np.arange(k + 1))
+        grupos = [y_ordenado[limites[i]:limites[i + 1]] for i in range(k)]
+        grupos_validos = [g for g in grupos if g.size >= 2]  # Levene precisa de grupos com pelo menos 2 obs
         if len(grupos_validos) >= 2:
             stat_levene, p_levene = levene(*grupos_validos)
             results["levene_test"] = (stat_levene, p_levene)
@@ -130,36 +245,132 @@ def perform_anova_for_variable(df_analysis, var_cat, col_preco):
         results["homocedasticidade_ok"] = homocedasticidade_ok
 
         # 3. Kruskal-Wallis (se necessário)
-        if not normalidade_ok or not homocedasticidade_ok:
-            if len(grupos_validos) >= 2:
-                stat_kruskal, p_kruskal = kruskal(*grupos_validos)
+        if (not normalidade_ok or not homocedasticidade_ok) and len(grupos_validos) >= 2:
+            if (p_valor_anova is not None and p_valor_anova < P_VALOR_DISPENSA_KRUSKAL
+                    and min(len(g) for g in grupos_validos) > MIN_OBS_DISPENSA_KRUSKAL):
+                results["kruskal_test"] = None  # Pulado: resultado não mudaria a decisão
+            else:
+                # Reaproveita o buffer ordenado do Levene, restrito aos grupos com pelo menos 2 obs
+                tamanhos = np.diff(limites)
+                validos = tamanhos >= 2
+                if validos.all():
+                    y_kruskal, limites_kruskal = y_ordenado, limites
+                else:
+                    y_kruskal = y_ordenado[np.repeat(validos, tamanhos)]
+                    limites_kruskal = np.concatenate(([0], np.cumsum(tamanhos[validos])))
+                stat_kruskal, p_kruskal = kruskal_ordenado(y_kruskal, limites_kruskal)
                 results["kruskal_test"] = (stat_kruskal, p_kruskal)
 
-        # Boxplot
-        fig_box, ax_box = plt.subplots(figsize=(10, 5))
-        unique_cats = df_var[var_cat].nunique()
-        order_boxplot = None
-        if unique_cats > 5 and unique_cats < 50:  # Evitar ordenar muitas categorias
-            try:
-                order_boxplot = df_var.groupby(var_cat)[col_preco].median().sort_values().index
-            except Exception:
-                order_boxplot = df_var[var_cat].unique()  # Fallback
-
-        sns.boxplot(x=var_cat, y=col_preco, data=df_var, order=order_boxplot, ax=ax_box, palette="viridis")
-        ax_box.set_title(f'Distribuição de {col_preco} por {var_cat}', fontsize=12)
-        if unique_cats > 10:
-            plt.setp(ax_box.get_xticklabels(), rotation=45, ha='right', fontsize=8)
-        else:
-            plt.setp(ax_box.get_xticklabels(), fontsize=9)
-
-        plt.tight_layout()
-        results["plots"]["boxplot"] = fig_box
+    except Exception as e:
+        results["error"] = str(e)
+    return results
+
+
+def _fig_to_png(fig):
+    """Rasteriza a figura em PNG e libera o canvas do Matplotlib."""
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=90)
+    plt.close(fig)
+    return buf.getvalue()
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _render_normality_png(residuos, var_cat):
+    """Histograma e Q-Q plot dos resíduos, como PNG em cache."""
+    fig_norm, ax_norm = plt.subplots(1, 2, figsize=(10, 4), constrained_layout=True)
+    if len(residuos) > 1:
+        contagens, bordas = np.histogram(residuos, bins=30, density=True)
+        ax_norm[0].bar(bordas[:-1], contagens, width=np.diff(bordas), align='edge', alpha=0.6, edgecolor='white')
+        if np.ptp(residuos) > 0:  # KDE avaliado em 200 pontos (gaussian_kde é singular sem variância)
+            xs = np.linspace(residuos.min(), residuos.max(), 200)
+            ax_norm[0].plot(xs, gaussian_kde(residuos)(xs))
+        ax_norm[0].set_ylabel("Density")
+        ax_norm[0].set_title(f'Histograma Resíduos ({var_cat})', fontsize=10)
+        amostra_qq = residuos
+        if len(residuos) > TAMANHO_AMOSTRA_QQ:  # Visualmente idêntico, com bem menos pontos
+            amostra_qq = np.random.default_rng(0).choice(residuos, TAMANHO_AMOSTRA_QQ, replace=False)
+        sm.qqplot(amostra_qq, line='s', ax=ax_norm[1], markerfacecolor="skyblue", markeredgecolor="dodgerblue",
+                  alpha=0.7)
+        ax_norm[1].set_title(f'Q-Q Plot Resíduos ({var_cat})', fontsize=10)
+    else:
+        ax_norm[0].text(0.5, 0.5, "Poucos dados", ha='center', va='center')
+        ax_norm[1].text(0.5, 0.5, "Poucos dados", ha='center', va='center')
+    return _fig_to_png(fig_norm)
+
+
+@st.cache_data(show_spinner=False, max_entries=64)
+def _render_boxplot_png(df_var, var_cat, col_preco):
+    """Boxplot do preço por categoria, como PNG em cache."""
+    fig_box, ax_box = plt.subplots(figsize=(10, 5), constrained_layout=True)
+    unique_cats = df_var[var_cat].nunique()
+    order_boxplot = None
+    if unique_cats > 5 and unique_cats < 50:  # Evitar ordenar muitas categorias
+        try:
+            # observed=True: não materializa níveis da categoria sem observações
+            order_boxplot = (df_var.groupby(var_cat, observed=True, sort=False)[col_preco]
+                             .median().sort_values().index)
+        except Exception:
+            order_boxplot = df_var[var_cat].unique()  # Fallback
+
+    # Quartis sobre todos os dados; outliers omitidos em amostras grandes (se sobrepõem no gráfico)
+    sns.boxplot(x=var_cat, y=col_preco, data=df_var, order=order_boxplot, ax=ax_box, palette="viridis",
+                showfliers=len(df_var) <= MAX_OBS_BOXPLOT_OUTLIERS)
+    ax_box.set_title(f'Distribuição de {col_preco} por {var_cat}', fontsize=12)
+    if unique_cats > 10:
+        plt.setp(ax_box.get_xticklabels(), rotation=45, ha='right', fontsize=8)
+    else:
+        plt.setp(ax_box.get_xticklabels(), fontsize=9)
+
+    return _fig_to_png(fig_box)
+
+
+def _build_plots(df_var, var_cat, col_preco, residuos):
+    """Gera (ou recupera do cache) os PNGs de normalidade e boxplot."""
+    return {
+        "normalidade": _render_normality_png(residuos, var_cat),
+        "boxplot": _render_boxplot_png(df_var, var_cat, col_preco),
+    }
+
+
+def perform_anova_for_variable(df_analysis, var_cat, col_preco, calculos=None):
+    """Executa ANOVA e testes de pressupostos para uma variável.
+
+    df_analysis deve conter apenas [var_cat, col_preco], sem NaNs.
+    `calculos` permite reaproveitar um resultado de `_anova_compute` já obtido (ex.: numa thread).
+    """
+    if calculos is None:
+        calculos = _anova_compute_contado(df_analysis, var_cat, col_preco)
+    results = dict(calculos)
+    results["plots"] = {}
+    if "error" in results:
+        return results
 
+    try:
+        results["plots"] = _build_plots(df_analysis, var_cat, col_preco, results["residuos"])
     except Exception as e:
         results["error"] = str(e)
     return results
 
 
+@st.cache_resource  # Um único conjunto de contadores por processo, sobrevive aos reruns
+def _contadores_cache():
+    """Contadores de chamadas e misses do cache de `_anova_compute` (hits = chamadas - misses)."""
+    return {"chamadas": 0, "misses": 0, "lock": threading.Lock()}
+
+
+def _registrar_cache(evento):
+    """Incrementa um contador do cache das análises ("chamadas" ou "misses")."""
+    contadores = _contadores_cache()
+    with contadores["lock"]:
+        contadores[evento] += 1
+
+
+def _anova_compute_contado(df_analysis, var_cat, col_preco):
+    """Chama `_anova_compute` registrando a chamada; o miss é registrado dentro da função em cache."""
+    _registrar_cache("chamadas")
+    return _anova_compute(df_analysis, var_cat, col_preco)
+
+
 # --- Interface do Streamlit ---
 st.set_page_config(layout="wide", page_title="Dashboard de Análise Imobiliária ANOVA")
 
@@ -191,82 +402,107 @@ if df is not None and coluna_preco is not None:
         st.header("2. Resultados da Análise ANOVA")
         st.markdown(f"Analisando o impacto de **{', '.join(variaveis_selecionadas)}** sobre **{coluna_preco}**.")
 
-        for var_analisada in variaveis_selecionadas:
-            st.subheader(f"Análise para: `{var_analisada}`")
-
-            # Prepara dados específicos para a variável (remove NaNs apenas para as colunas envolvidas)
-            df_analise_var = df[[var_analisada, coluna_preco]].copy()
-            df_analise_var.dropna(subset=[var_analisada, coluna_preco], inplace=True)
-
-            if df_analise_var.empty or df_analise_var[var_analisada].nunique() < 2:
-                st.warning(f"Não há dados suficientes ou níveis para '{var_analisada}' após limpeza. Pulando.")
-                continue
-
-            resultados_var = perform_anova_for_variable(df_analise_var, var_analisada, coluna_preco)
-
-            if "error" in resultados_var:
-                st.error(f"Erro ao analisar '{var_analisada}': {resultados_var['error']}")
-                continue
-
-            # Exibir Tabela ANOVA
-            if "anova_table" in resultados_var:
-                st.markdown("**Tabela ANOVA:**")
-                st.dataframe(resultados_var["anova_table"])
-                p_anova = resultados_var.get("p_valor_anova")
-                if p_anova is not None:
-                    if p_anova < 0.05:
-                        st.success(
-                            f"✅ ANOVA: Há uma diferença estatisticamente significativa nos preços (p-valor: {p_anova:.4e}).")
-                    else:
-                        st.info(
-                            f"ℹ️ ANOVA: Não há uma diferença estatisticamente significativa nos preços (p-valor: {p_anova:.4e}).")
-
-            # Pressupostos e Testes Alternativos
-            with st.expander("Verificar Pressupostos da ANOVA e Testes Alternativos"):
-                st.markdown("**Normalidade dos Resíduos:**")
-                if "shapiro_test" in resultados_var:
-                    stat, p_val = resultados_var["shapiro_test"]
-                    st.write(f"Shapiro-Wilk: Estatística={stat:.4f}, P-valor={p_val:.4e}")
-                elif "anderson_test" in resultados_var:
-                    ad_res = resultados_var["anderson_test"]
-                    st.write(f"Anderson-Darling: Estatística={ad_res.statistic:.4f}")
-                    # st.write(f"  Valores Críticos: {ad_res.critical_values}")
-                    # st.write(f"  Níveis de Significância: {ad_res.significance_level}")
-
-                if resultados_var.get("normalidade_ok"):
-                    st.success("✅ Resíduos parecem ser normalmente distribuídos.")
-                else:
-                    st.warning("⚠️ Resíduos NÃO parecem ser normalmente distribuídos.")
-
-                if "normalidade" in resultados_var["plots"]:
-                    st.pyplot(resultados_var["plots"]["normalidade"])
-
-                st.markdown("**Homogeneidade das Variâncias (Homocedasticidade):**")
-                if "levene_test" in resultados_var:
-                    stat_l, p_l = resultados_var["levene_test"]
-                    st.write(f"Teste de Levene: Estatística={stat_l:.4f}, P-valor={p_l:.4e}")
-                    if resultados_var.get("homocedasticidade_ok"):
-                        st.success("✅ Variâncias parecem ser homogêneas.")
+        # Prepara dados específicos para cada variável: só as duas colunas envolvidas (hash do cache barato),
+        # com os NaNs removidos aqui, uma única vez para todo o caminho de análise
+        dados_por_variavel = {v: df[[v, coluna_preco]].dropna() for v in variaveis_selecionadas}
+
+        # Cálculos independentes em paralelo (NumPy/SciPy liberam o GIL); os gráficos ficam na thread principal.
+        # Cada resultado é materializado quando a seção da variável é desenhada.
+        with ThreadPoolExecutor(max_workers=len(dados_por_variavel), initializer=add_script_run_ctx,
+                                initargs=(None, get_script_run_ctx())) as executor:
+            futures = {v: executor.submit(_anova_compute_contado, d, v, coluna_preco)
+                       for v, d in dados_por_variavel.items()}
+
+            for var_analisada in variaveis_selecionadas:
+                st.subheader(f"Análise para: `{var_analisada}`")
+
+                try:
+                    calculos = futures[var_analisada].result()
+                except Exception as e:  # Falha fora do try interno (ex.: hashing do cache)
+                    calculos = {"var_cat": var_analisada, "error": str(e)}
+
+                if calculos.get("dados_insuficientes"):
+                    st.warning(f"Não há dados suficientes ou níveis para '{var_analisada}' após limpeza. Pulando.")
+                    continue
+
+                resultados_var = perform_anova_for_variable(dados_por_variavel[var_analisada], var_analisada,
+                                                            coluna_preco, calculos=calculos)
+
+                if "error" in resultados_var:
+                    st.error(f"Erro ao analisar '{var_analisada}': {resultados_var['error']}")
+                    continue
+
+                # Exibir Tabela ANOVA
+                if "anova_table" in resultados_var:
+                    st.markdown("**Tabela ANOVA:**")
+                    st.dataframe(resultados_var["anova_table"])
+                    p_anova = resultados_var.get("p_valor_anova")
+                    if p_anova is not None:
+                        if p_anova < 0.05:
+                            st.success(
+                                f"✅ ANOVA: Há uma diferença estatisticamente significativa nos preços (p-valor: {p_anova:.4e}).")
+                        else:
+                            st.info(
+                                f"ℹ️ ANOVA: Não há uma diferença estatisticamente significativa nos preços (p-valor: {p_anova:.4e}).")
+
+                # Pressupostos e Testes Alternativos
+                with st.expander("Verificar Pressupostos da ANOVA e Testes Alternativos"):
+                    n_residuos = resultados_var.get("residuos_count", 0)
+                    n_amostra = resultados_var.get("shapiro_amostra", n_residuos)
+                    ajuda_normalidade = None
+                    if "shapiro_test" in resultados_var and n_amostra < n_residuos:
+                        ajuda_normalidade = (f"Shapiro-Wilk calculado sobre uma subamostra aleatória fixa de {n_amostra} "
+                                             f"dos {n_residuos} resíduos: o custo cai bastante e a decisão a 5% "
+                                             "permanece equivalente (o p-valor fica menos sensível a desvios pequenos).")
+                    st.markdown("**Normalidade dos Resíduos:**", help=ajuda_normalidade)
+                    if "shapiro_test" in resultados_var:
+                        stat, p_val = resultados_var["shapiro_test"]
+                        st.write(f"Shapiro-Wilk: Estatística={stat:.4f}, P-valor={p_val:.4e}")
+                    elif "anderson_test" in resultados_var:
+                        ad_res = resultados_var["anderson_test"]
+                        st.write(f"Anderson-Darling: Estatística={ad_res.statistic:.4f}")
+                        # st.write(f"  Valores Críticos: {ad_res.critical_values}")
+                        # st.write(f"  Níveis de Significância: {ad_res.significance_level}")
+
+                    if resultados_var.get("normalidade_ok"):
+                        st.success("✅ Resíduos parecem ser normalmente distribuídos.")
                     else:
-                        st.warning("⚠️ Variâncias NÃO parecem ser homogêneas.")
-                else:
-                    st.write("Teste de Levene não pôde ser realizado (dados insuficientes).")
-
-                if "kruskal_test" in resultados_var:
-                    st.markdown("**Teste de Kruskal-Wallis (Alternativa Não Paramétrica):**")
-                    stat_k, p_k = resultados_var["kruskal_test"]
-                    st.write(f"Kruskal-Wallis: Estatística={stat_k:.4f}, P-valor={p_k:.4e}")
-                    if p_k < 0.05:
-                        st.success(f"✅ Kruskal-Wallis: Diferença significativa nas medianas dos preços.")
+                        st.warning("⚠️ Resíduos NÃO parecem ser normalmente distribuídos.")
+
+                    if "normalidade" in resultados_var["plots"]:
+                        st.image(resultados_var["plots"]["normalidade"])
+
+                    st.markdown("**Homogeneidade das Variâncias (Homocedasticidade):**")
+                    if "levene_test" in resultados_var:
+                        stat_l, p_l = resultados_var["levene_test"]
+                        st.write(f"Teste de Levene: Estatística={stat_l:.4f}, P-valor={p_l:.4e}")
+                        if resultados_var.get("homocedasticidade_ok"):
+                            st.success("✅ Variâncias parecem ser homogêneas.")
+                        else:
+                            st.warning("⚠️ Variâncias NÃO parecem ser homogêneas.")
                     else:
-                        st.info(f"ℹ️ Kruskal-Wallis: Sem diferença significativa nas medianas dos preços.")
-
-            # Boxplot
-            if "boxplot" in resultados_var["plots"]:
-                st.markdown("**Distribuição de Preços por Categoria:**")
-                st.pyplot(resultados_var["plots"]["boxplot"])
-
-            st.markdown("---")  # Separador entre variáveis
+                        st.write("Teste de Levene não pôde ser realizado (dados insuficientes).")
+
+                    if "kruskal_test" in resultados_var and resultados_var["kruskal_test"] is None:
+                        st.markdown("**Teste de Kruskal-Wallis (Alternativa Não Paramétrica):**")
+                        st.info(f"ℹ️ Kruskal-Wallis não executado: a ANOVA tem p-valor < {P_VALOR_DISPENSA_KRUSKAL:.0e} e "
+                                f"todos os grupos têm mais de {MIN_OBS_DISPENSA_KRUSKAL} observações, então o teste "
+                                "não alteraria a conclusão.")
+                    elif "kruskal_test" in resultados_var:
+                        st.markdown("**Teste de Kruskal-Wallis (Alternativa Não Paramétrica):**")
+                        stat_k, p_k = resultados_var["kruskal_test"]
+                        st.write(f"Kruskal-Wallis: Estatística={stat_k:.4f}, P-valor={p_k:.4e}")
+                        if p_k < 0.05:
+                            st.success(f"✅ Kruskal-Wallis: Diferença significativa nas medianas dos preços.")
+                        else:
+                            st.info(f"ℹ️ Kruskal-Wallis: Sem diferença significativa nas medianas dos preços.")
+
+                # Boxplot
+                if "boxplot" in resultados_var["plots"]:
+                    st.markdown("**Distribuição de Preços por Categoria:**")
+                    st.image(resultados_var["plots"]["boxplot"])
+
+                st.markdown("---")  # Separador entre variáveis
 
     elif not variaveis_selecionadas and st.sidebar.button("Analisar", type="primary",
                                                           help="Clique para iniciar após selecionar as variáveis.",
@@ -274,6 +510,16 @@ if df is not None and coluna_preco is not None:
         # Botão fica desabilitado até selecionar algo, apenas para feedback visual
         pass
 
+    with st.sidebar.expander("🛠️ Diagnóstico de cache"):
+        contadores = _contadores_cache()
+        misses = contadores["misses"]
+        st.write(f"Cache das análises: {contadores['chamadas'] - misses} hits / {misses} misses")
+        if st.button("Limpar cache das análises"):
+            _anova_compute.clear()
+            with contadores["lock"]:
+                contadores["chamadas"] = contadores["misses"] = 0
+            st.rerun()  # Os resultados acima já foram desenhados com o cache antigo
+
     st.sidebar.markdown("---")
     st.sidebar.markdown("Desenvolvido como parte de uma análise de dados imobiliários.")
 
@@ -0,0 +1,108 @@
+# test_anova_kernels.py
+import os
+
+import numpy as np
+import pytest
+from scipy.stats import kruskal, levene, shapiro
+
+from anova_kernels import _anova_ss_loop, _anova_ss_numpy, anova_ss, kruskal_ordenado
+
+CAMINHO_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), "AmesHousing.csv")
+
+
+def _dados_agrupados(n_total=2930, k=25, seed=0):
+    """Preços inteiros na escala do Ames Housing, com médias diferentes por grupo."""
+    rng = np.random.default_rng(seed)
+    codes = rng.integers(0, k, size=n_total).astype(np.int64)
+    codes[:k] = np.arange(k)  # Garante que todos os grupos aparecem
+    y = np.round(rng.normal(150_000 + 4_000 * codes, 30_000)).astype(np.float64)
+    return y, codes, k
+
+
+def _anova_ss_referencia(y, codes, k):
+    """Definição direta: SSB = Σ n_i (ȳ_i - ȳ)², SSW = Σ (y_ij - ȳ_i)²."""
+    n = np.array([(codes == j).sum() for j in range(k)])
+    means = np.array([y[codes == j].mean() for j in range(k)])
+    ssb = (n * (means - y.mean()) ** 2).sum()
+    ssw = ((y - means[codes]) ** 2).sum()
+    return n, means, ssb, ssw
+
+
+@pytest.mark.parametrize("kernel", [_anova_ss_loop, _anova_ss_numpy, anova_ss],
+                         ids=["loop_python", "numpy", "anova_ss"])
+def test_kernels_concordam_com_a_definicao(kernel):
+    y, codes, k = _dados_agrupados()
+    n_ref, means_ref, ssb_ref, ssw_ref = _anova_ss_referencia(y, codes, k)
+
+    n, means, ssb, ssw = kernel(y, codes, k)
+
+    np.testing.assert_array_equal(n, n_ref)
+    np.testing.assert_allclose(means, means_ref, rtol=1e-12)
+    assert ssb == pytest.approx(ssb_ref, rel=1e-9)
+    assert ssw == pytest.approx(ssw_ref, rel=1e-9)
+
+
+def test_numba_e_numpy_sao_intercambiaveis():
+    numba = pytest.importorskip("numba")
+    y, codes, k = _dados_agrupados(seed=1)
+
+    compilado = numba.njit(_anova_ss_loop)(y, codes, k)
+    vetorizado = _anova_ss_numpy(y, codes, k)
+
+    np.testing.assert_array_equal(compilado[0], vetorizado[0])
+    np.testing.assert_allclose(compilado[1], vetorizado[1], rtol=1e-12)
+    assert compilado[2] == pytest.approx(vetorizado[2], rel=1e-9)
+    assert compilado[3] == pytest.approx(vetorizado[3], rel=1e-9)
+
+
+def _precos_ames_por_bairro():
+    pd = pytest.importorskip("pandas")
+    df = pd.read_csv(CAMINHO_CSV, usecols=["Neighborhood", "SalePrice"]).dropna()
+    codes, niveis = pd.factorize(df["Neighborhood"], sort=True)
+    return df["SalePrice"].to_numpy(dtype=np.float64), codes.astype(np.int64), len(niveis)
+
+
+def _precos_sinteticos_homogeneos():
+    """Grupos com a mesma distribuição: p-valores longe de zero, onde diferenças de precisão apareceriam."""
+    rng = np.random.default_rng(42)
+    k = 6
+    codes = np.repeat(np.arange(k), 150).astype(np.int64)
+    y = np.round(rng.normal(180_000, 40_000, size=codes.size)).astype(np.float64)
+    return y, codes, k
+
+
+@pytest.mark.parametrize("carregar", [_precos_ames_por_bairro, _precos_sinteticos_homogeneos],
+                         ids=["ames_neighborhood", "sintetico"])
+def test_pvalores_em_float32_concordam_com_float64(carregar):
+    y64, codes, k = carregar()
+    ordem = np.argsort(codes, kind='stable')
+    limites = np.searchsorted(codes[ordem], np.arange(k + 1))
+
+    _, means, _, _ = anova_ss(y64, codes, k)
+    residuos64 = y64 - means[codes]
+
+    def pvalores(y, residuos):
+        y_ordenado = y[ordem]
+        grupos = [y_ordenado[limites[i]:limites[i + 1]] for i in range(k)]
+        return {"shapiro": shapiro(residuos)[1],
+                "levene": levene(*grupos)[1],
+                "kruskal": kruskal_ordenado(y_ordenado, limites)[1]}
+
+    p64 = pvalores(y64, residuos64)
+    p32 = pvalores(y64.astype(np.float32), residuos64.astype(np.float32))
+
+    for teste in p64:
+        assert p32[teste] == pytest.approx(p64[teste], abs=1e-4), teste
+
+
+def test_kruskal_ordenado_igual_ao_scipy():
+    y, codes, k = _dados_agrupados(k=8, seed=3)
+    ordem = np.argsort(codes, kind='stable')
+    y_ordenado = y[ordem]
+    limites = np.searchsorted(codes[ordem], np.arange(k + 1))
+
+    stat, p = kruskal_ordenado(y_ordenado, limites)
+    stat_ref, p_ref = kruskal(*[y_ordenado[limites[i]:limites[i + 1]] for i in range(k)])
+
+    assert stat == pytest.approx(stat_ref, rel=1e-10)
+    assert p == pytest.approx(p_ref, rel=1e-8)